@@ -1,22 +1,48 @@
 """
 Telegram Bot implementation for Esteghlal News Aggregator
 """
+import asyncio
+import hashlib
 import logging
+import re
 from datetime import datetime
+from typing import Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
 from telegram.constants import ParseMode
 from rss_parser import RSSParser
-from config import Config
-import requests
-from bs4 import BeautifulSoup
+from config import get_config
+import aiohttp
+from cachetools import TTLCache
+from lxml import html as lxml_html
 
 logger = logging.getLogger(__name__)
 
+# Upper bounds for full-article retrieval
+MAX_ARTICLE_BYTES = 256 * 1024
+MAX_ARTICLE_CHARS = 3000
+
+# Callback query patterns
+_LATEST_RE = re.compile(r"^latest_news$")
+_FULL_RE = re.compile(r"^full_news_[0-9a-f]+$")
+
+# <meta charset=...> or <meta http-equiv="Content-Type" content="...; charset=...">
+_META_CHARSET_RE = re.compile(rb"<meta[^>]+charset", re.IGNORECASE)
+
 class EsteghlalNewsBot:
     def __init__(self):
-        self.config = Config()
+        self.config = get_config()
         self.rss_parser = RSSParser()
+        
+        # Shared HTTP session for article fetches; created in run() so it binds to the running loop
+        self.http: Optional[aiohttp.ClientSession] = None
+        
+        # Parsed article text keyed by URL
+        self.article_cache = TTLCache(maxsize=512, ttl=self.config.CACHE_TIMEOUT)
+        
+        # Article URLs keyed by the short id carried in callback_data
+        self._url_by_id = TTLCache(maxsize=10_000, ttl=24 * 3600)
+        
         if not self.config.TELEGRAM_BOT_TOKEN:
             raise ValueError("TELEGRAM_BOT_TOKEN is required")
         self.app = Application.builder().token(self.config.TELEGRAM_BOT_TOKEN).build()
@@ -25,8 +51,8 @@ class EsteghlalNewsBot:
     def _setup_handlers(self):
         """Setup command and callback handlers"""
         self.app.add_handler(CommandHandler("start", self.start_command))
-        self.app.add_handler(CallbackQueryHandler(self.latest_news_handler, pattern="^latest_news$"))
-        self.app.add_handler(CallbackQueryHandler(self.full_news_handler, pattern="^full_news_\\d+$"))
+        self.app.add_handler(CallbackQueryHandler(self.latest_news_handler, pattern=_LATEST_RE))
+        self.app.add_handler(CallbackQueryHandler(self.full_news_handler, pattern=_FULL_RE))
 
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
@@ -43,24 +69,68 @@ class EsteghlalNewsBot:
             logger.error(f"Error in start command: {e}")
             await update.message.reply_text("خطا در اجرای دستور. لطفاً دوباره تلاش کنید.")
 
-    def fetch_full_article(self, url):
+    async def fetch_full_article(self, url):
         """Fetch full article content using web scraping"""
+        if url in self.article_cache:
+            return self.article_cache[url]
+        
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
+            timeout = aiohttp.ClientTimeout(total=self.config.REQUEST_TIMEOUT)
+            async with self.http.get(url, timeout=timeout) as response:
+                response.raise_for_status()
+                
+                # Stop downloading once enough HTML for the article text has arrived
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    body.extend(chunk)
+                    if len(body) >= MAX_ARTICLE_BYTES:
+                        break
+                html = bytes(body[:MAX_ARTICLE_BYTES])
+                
+                # Many sites only declare the charset in the Content-Type header
+                encoding = self._article_encoding(response.charset, html)
             
-            # Extract paragraphs
-            paragraphs = soup.find_all("p")
-            text = "\n\n".join([p.get_text().strip() for p in paragraphs if len(p.get_text().strip()) > 30])
+            # Parse off the event loop so other updates keep being served
+            text = await asyncio.to_thread(self._parse_article, html, encoding)
             
-            # Limit to 3000 characters to avoid long messages
-            return text[:3000] if text else "متأسفانه متن کامل خبر قابل دریافت نیست."
+            if not text:
+                return "متأسفانه متن کامل خبر قابل دریافت نیست."
+            
+            self.article_cache[url] = text
+            return text
             
         except Exception as e:
             logger.error(f"Error fetching full article from {url}: {e}")
             return "متأسفانه متن کامل خبر قابل دریافت نیست."
 
+    def _article_encoding(self, header_charset: Optional[str], html: bytes) -> Optional[str]:
+        """Pick the charset for an article: HTTP header, then the page's own <meta>, then UTF-8"""
+        if header_charset:
+            return header_charset
+        if _META_CHARSET_RE.search(html, 0, 2048):
+            # Let lxml read the declared charset itself
+            return None
+        return "utf-8"
+
+    def _parse_article(self, html: bytes, encoding: Optional[str]) -> str:
+        """Extract the article body text from raw HTML"""
+        doc = lxml_html.fromstring(html, parser=lxml_html.HTMLParser(encoding=encoding))
+        
+        # Extract paragraphs until the message limit is reached
+        paragraphs = []
+        length = 0
+        for p in doc.iterfind(".//p"):
+            t = p.text_content().strip()
+            if len(t) <= 30:
+                continue
+            paragraphs.append(t)
+            length += len(t) + 2
+            if length >= MAX_ARTICLE_CHARS:
+                break
+        
+        # Limit to 3000 characters to avoid long messages
+        return "\n\n".join(paragraphs)[:MAX_ARTICLE_CHARS]
+
     async def latest_news_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle latest news callback"""
         query = update.callback_query
@@ -73,38 +143,61 @@ class EsteghlalNewsBot:
                 await query.message.reply_text("در حال حاضر خبری در دسترس نیست.")
                 return
 
-            # Send each news item with a button to view full text
-            for idx, news in enumerate(news_list, start=1):
-                buttons = [[InlineKeyboardButton("📖 نمایش متن کامل", callback_data=f"full_news_{idx}")]]
+            # Send items strictly in order (newest first), building the next message
+            # while the previous one is still in flight
+            failed = 0
+            sending = None
+            for news in news_list:
+                news_id = hashlib.blake2b(news["link"].encode(), digest_size=8).hexdigest()
+                self._url_by_id[news_id] = news["link"]
+                
+                buttons = [[InlineKeyboardButton("📖 نمایش متن کامل", callback_data=f"full_news_{news_id}")]]
                 reply_markup = InlineKeyboardMarkup(buttons)
                 
                 summary = news.get('description', '')[:300] + '...' if len(news.get('description', '')) > 300 else news.get('description', '')
                 text = f"✅ {news['title']}\n\n{summary}\n\n{news['link']}"
                 
-                # Store the link in user_data for retrieval
-                context.user_data[f"full_news_{idx}"] = news["link"]
+                if sending is not None and not await self._finish_reply(*sending):
+                    failed += 1
+                sending = (news, asyncio.create_task(query.message.reply_text(text, reply_markup=reply_markup)))
                 
-                await query.message.reply_text(text, reply_markup=reply_markup)
+                # Yield so the send starts before the next message is built
+                await asyncio.sleep(0)
+            
+            if not await self._finish_reply(*sending):
+                failed += 1
+            
+            if failed == len(news_list):
+                await query.message.reply_text("خطا در دریافت اخبار. لطفاً دوباره تلاش کنید.")
                 
         except Exception as e:
             logger.error(f"Error in latest news handler: {e}")
             await query.message.reply_text("خطا در دریافت اخبار. لطفاً دوباره تلاش کنید.")
 
+    async def _finish_reply(self, news: dict, task: asyncio.Task) -> bool:
+        """Wait for a news item send to complete, logging failures"""
+        try:
+            await task
+            return True
+        except Exception as e:
+            logger.error(f"Error sending news item {news['link']}: {e}")
+            return False
+
     async def full_news_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle full news callback"""
         query = update.callback_query
         await query.answer()
         
         try:
-            key = query.data
-            url = context.user_data.get(key)
+            news_id = query.data[len("full_news_"):]
+            url = self._url_by_id.get(news_id)
             
             if not url:
                 await query.message.reply_text("لینک خبر پیدا نشد.")
                 return
             
             # Fetch full article content
-            full_text = self.fetch_full_article(url)
+            full_text = await self.fetch_full_article(url)
             await query.message.reply_text(full_text)
             
         except Exception as e:
@@ -124,6 +217,7 @@ class EsteghlalNewsBot:
     async def run(self):
         """Start the bot"""
         logger.info("Esteghlal News Bot is starting...")
+        self.http = aiohttp.ClientSession(headers={"User-Agent": "Mozilla/5.0 (compatible; AbiDelBot/1.0)"})
         await self.app.initialize()
         await self.app.start()
         await self.app.updater.start_polling()
@@ -131,9 +225,10 @@ class EsteghlalNewsBot:
         logger.info("Bot is running. Press Ctrl+C to stop.")
         
         try:
-            import asyncio
             await asyncio.Event().wait()
         except KeyboardInterrupt:
             logger.info("Bot stopped by user")
         finally:
             await self.app.stop()
+            await self.http.close()
+            await self.rss_parser.close()
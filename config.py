@@ -3,6 +3,7 @@ Configuration settings for Persian Sports News Bot
 """
 import os
 import logging
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
@@ -61,3 +62,9 @@ class Config:
         
         logger.info("All required configuration variables are present")
         return True
+
+
+@lru_cache(maxsize=None)
+def get_config() -> Config:
+    """Return the process-wide configuration, loading it on first use"""
+    return Config()
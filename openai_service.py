@@ -1,19 +1,39 @@
 """
 OpenAI Service for Persian Text Summarization and Analysis
 """
+import asyncio
 import json
 import os
 import logging
 from typing import Optional
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
 logger = logging.getLogger(__name__)
 
+SPORTS_CATEGORIES = [
+    "فوتبال",
+    "بسکتبال",
+    "والیبال",
+    "کشتی و رزمی",
+    "دو و میدانی",
+    "سایر ورزش‌ها",
+]
+
+# Items per batched request, keeping max_tokens within the model's output limit
+MAX_BATCH_SIZE = 8
+
 class OpenAIService:
     def __init__(self):
         # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
         # do not change this unless explicitly requested by the user
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Async client with a larger connection pool so concurrent requests don't queue
+        self.client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60)
+            )
+        )
         self.model = "gpt-4o"
 
     async def summarize_persian_news(self, text: str) -> str:
@@ -33,7 +53,7 @@ class OpenAIService:
 {text}
 """
 
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {
@@ -65,6 +85,82 @@ class OpenAIService:
             logger.error(f"Error summarizing Persian news: {e}")
             return "خطا در تولید خلاصه. متن اصلی نمایش داده می‌شود."
 
+    async def summarize_many(self, texts: list) -> list:
+        """Summarize several Persian news articles, batching them into as few requests as possible"""
+        summaries = [None] * len(texts)
+        
+        # Apply the same "too short" guard as summarize_persian_news per item
+        pending = []
+        for i, text in enumerate(texts):
+            if not text or len(text.strip()) < 50:
+                summaries[i] = "متن کوتاه است و نیازی به خلاصه‌سازی ندارد."
+            else:
+                pending.append(i)
+        
+        # Chunk so the combined output stays within the model's max_tokens budget
+        chunks = [pending[i:i + MAX_BATCH_SIZE] for i in range(0, len(pending), MAX_BATCH_SIZE)]
+        results = await asyncio.gather(*(self._summarize_batch([texts[i] for i in chunk]) for chunk in chunks))
+        
+        for chunk, batch in zip(chunks, results):
+            for i, summary in zip(chunk, batch):
+                summaries[i] = summary
+        
+        return summaries
+
+    async def _summarize_batch(self, texts: list) -> list:
+        """Summarize up to MAX_BATCH_SIZE articles in a single request"""
+        fallback = ["خطا در تولید خلاصه. متن اصلی نمایش داده می‌شود."] * len(texts)
+        try:
+            articles = "\n\n".join(f"خبر {i}:\n{text}" for i, text in enumerate(texts, start=1))
+            
+            prompt = f"""
+لطفاً هر یک از {len(texts)} متن خبری فارسی زیر را جداگانه به صورت مختصر و مفید خلاصه کنید. هر خلاصه باید:
+- حداکثر 3-4 جمله باشد
+- نکات مهم و کلیدی را شامل شود
+- به زبان فارسی و با قواعد درست نوشته شود
+
+پاسخ را به صورت JSON با فرمت زیر و به همان ترتیب شماره‌ها ارائه دهید:
+{{"summaries": ["خلاصه خبر 1", "خلاصه خبر 2"]}}
+
+{articles}
+"""
+
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "شما یک خلاصه‌نویس حرفه‌ای هستید که متخصص در خلاصه‌سازی اخبار ورزشی فارسی است."
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                response_format={"type": "json_object"},
+                max_tokens=200 * len(texts),
+                temperature=0.3
+            )
+            
+            content = response.choices[0].message.content
+            if content:
+                summaries = json.loads(content).get("summaries")
+            else:
+                raise Exception("No content received")
+            
+            if not isinstance(summaries, list) or len(summaries) != len(texts):
+                raise Exception(f"Expected a list of {len(texts)} summaries, got {summaries!r}")
+            
+            return [
+                summary.strip() if isinstance(summary, str) and len(summary.strip()) >= 20
+                else "خلاصه‌ای از این خبر تهیه نشد."
+                for summary in summaries
+            ]
+            
+        except Exception as e:
+            logger.error(f"Error summarizing Persian news batch: {e}")
+            return fallback
+
     async def analyze_news_sentiment(self, text: str) -> dict:
         """Analyze sentiment of Persian news text"""
         try:
@@ -77,7 +173,7 @@ class OpenAIService:
 {text}
 """
 
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {
@@ -129,7 +225,7 @@ class OpenAIService:
 {text}
 """
 
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {
@@ -156,6 +252,68 @@ class OpenAIService:
             logger.error(f"Error categorizing news: {e}")
             return "سایر ورزش‌ها"
 
+    async def categorize_many(self, items: list) -> list:
+        """Categorize several (title, description) news items, batching them into as few requests as possible"""
+        chunks = [items[i:i + MAX_BATCH_SIZE] for i in range(0, len(items), MAX_BATCH_SIZE)]
+        results = await asyncio.gather(*(self._categorize_batch(chunk) for chunk in chunks))
+        return [category for batch in results for category in batch]
+
+    async def _categorize_batch(self, items: list) -> list:
+        """Categorize up to MAX_BATCH_SIZE (title, description) items in a single request"""
+        default = "سایر ورزش‌ها"
+        try:
+            news = "\n\n".join(
+                f"خبر {i}:\nعنوان: {title}\nتوضیحات: {description}"
+                for i, (title, description) in enumerate(items, start=1)
+            )
+            category_list = "\n".join(f"- {category}" for category in SPORTS_CATEGORIES)
+            
+            prompt = f"""
+لطفاً هر یک از {len(items)} خبر ورزشی زیر را در یکی از دسته‌بندی‌های زیر قرار دهید:
+{category_list}
+
+پاسخ را به صورت JSON با فرمت زیر و به همان ترتیب شماره‌ها ارائه دهید:
+{{"categories": ["فوتبال", "والیبال"]}}
+
+{news}
+"""
+
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "شما یک متخصص دسته‌بندی اخبار ورزشی فارسی هستید."
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                response_format={"type": "json_object"},
+                max_tokens=20 * len(items),
+                temperature=0.1
+            )
+            
+            content = response.choices[0].message.content
+            if content:
+                categories = json.loads(content).get("categories")
+            else:
+                raise Exception("No content received")
+            
+            if not isinstance(categories, list) or len(categories) != len(items):
+                raise Exception(f"Expected a list of {len(items)} categories, got {categories!r}")
+            
+            return [
+                category.strip() if isinstance(category, str) and category.strip() in SPORTS_CATEGORIES
+                else default
+                for category in categories
+            ]
+            
+        except Exception as e:
+            logger.error(f"Error categorizing news batch: {e}")
+            return [default] * len(items)
+
     async def generate_news_keywords(self, text: str) -> list:
         """Extract keywords from Persian news text"""
         try:
@@ -168,7 +326,7 @@ class OpenAIService:
 {text}
 """
 
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {
@@ -199,7 +357,7 @@ class OpenAIService:
     async def ask_ai_about_esteghlal(self, question: str) -> str:
         """AI assistant for Esteghlal football team questions"""
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {
@@ -224,3 +382,7 @@ class OpenAIService:
         except Exception as e:
             logger.error(f"Error asking AI about Esteghlal: {e}")
             return "خطا در دریافت پاسخ از هوش مصنوعی."
+
+    async def close(self):
+        """Close the underlying HTTP client"""
+        await self.client.close()
@@ -1,19 +1,39 @@
 """
 RSS Feed Parser for Persian Sports News Sources
 """
+import calendar
 import feedparser
+import heapq
 import logging
-from datetime import datetime
-from typing import List, Dict, Optional
+import re
+from typing import List, Dict, Optional, Tuple
 import asyncio
+import time
+from email.utils import parsedate_to_datetime
 import aiohttp
-from config import Config
+from cachetools import TTLCache
+from config import get_config
 
 logger = logging.getLogger(__name__)
 
+_HTML_TAG_RE = re.compile(r'<[^<]+?>')
+_WS_RE = re.compile(r'\s+')
+
+_PERSIAN_MONTHS = [
+    'ژانویه', 'فوریه', 'مارس', 'آپریل', 'مه', 'ژوئن',
+    'ژوئیه', 'آگوست', 'سپتامبر', 'اکتبر', 'نوامبر', 'دسامبر'
+]
+
+# Arabic letters and digits to their Persian forms
+_AR2FA = str.maketrans({
+    'ي': 'ی', 'ك': 'ک', 'ى': 'ی', 'ة': 'ه',
+    '٠': '۰', '١': '۱', '٢': '۲', '٣': '۳', '٤': '۴',
+    '٥': '۵', '٦': '۶', '٧': '۷', '٨': '۸', '٩': '۹',
+})
+
 class RSSParser:
     def __init__(self):
-        self.config = Config()
+        self.config = get_config()
         self.rss_feeds = {
             'varzesh3': 'https://www.varzesh3.com/rss/all',
             'tarafdari': 'https://www.tarafdari.com/rss/all',
@@ -30,31 +50,43 @@ class RSSParser:
             'volleyball': ['والیبال', 'سایپا', 'کالای خودرو'],
             'athletics': ['دو و میدانی', 'دومیدانی', 'دوومیدانی', 'المپیک']
         }
+        
+        # One alternation per category so each text is scanned once for all keywords
+        self._category_patterns = {
+            category: re.compile('|'.join(map(re.escape, keywords)))
+            for category, keywords in self.category_keywords.items()
+        }
+        
+        # Esteghlal news keyed by limit, refreshed once per feed interval
+        self._esteghlal_cache = TTLCache(maxsize=8, ttl=self.config.FEED_REFRESH_INTERVAL)
+        
+        # Per-source (ETag, Last-Modified, raw entries) for conditional GETs
+        self._feed_state: Dict[str, Tuple[str, str, list]] = {}
+        
+        # Adaptive polling: back off on feeds that keep returning nothing new
+        self._next_poll_at: Dict[str, float] = {}
+        self._empty_streak: Dict[str, int] = {}
+        self._newest_entry: Dict[str, Optional[tuple]] = {}
+        
+        # Shared across refreshes so connections to the feed hosts are kept alive
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Lazily create the shared HTTP session"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=4, ttl_dns_cache=300, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    async def close(self):
+        """Close the shared HTTP session"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
 
     async def get_latest_news(self, limit: int = 10) -> List[Dict]:
         """Get latest news from all RSS feeds"""
         try:
-            all_news = []
-            
-            async with aiohttp.ClientSession() as session:
-                tasks = []
-                for source_name, feed_url in self.rss_feeds.items():
-                    task = self._fetch_feed(session, source_name, feed_url)
-                    tasks.append(task)
-                
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                for result in results:
-                    if isinstance(result, Exception):
-                        logger.error(f"Error fetching feed: {result}")
-                        continue
-                    if result and isinstance(result, list):
-                        all_news.extend(result)
-            
-            # Sort by publication date (newest first)
-            all_news.sort(key=lambda x: x.get('published_parsed', datetime.min), reverse=True)
-            
-            return all_news[:limit]
+            return await self._collect(None, limit)
             
         except Exception as e:
             logger.error(f"Error getting latest news: {e}")
@@ -68,15 +100,12 @@ class RSSParser:
             if category not in self.category_keywords:
                 return all_news[:limit]
             
-            keywords = self.category_keywords[category]
+            pattern = self._category_patterns[category]
             filtered_news = []
             
             for news_item in all_news:
-                title = news_item.get('title', '').lower()
-                description = news_item.get('description', '').lower()
-                
                 # Check if any keyword exists in title or description
-                if any(keyword in title or keyword in description for keyword in keywords):
+                if pattern.search(news_item.get('title', '')) or pattern.search(news_item.get('description', '')):
                     filtered_news.append(news_item)
                     
                 if len(filtered_news) >= limit:
@@ -90,41 +119,14 @@ class RSSParser:
 
     async def get_esteghlal_news(self, limit: int = 5) -> List[Dict]:
         """Get Esteghlal-specific news from all RSS feeds"""
+        if limit in self._esteghlal_cache:
+            return self._esteghlal_cache[limit]
+        
         try:
-            all_news = []
-            
-            async with aiohttp.ClientSession() as session:
-                tasks = []
-                for source_name, feed_url in self.rss_feeds.items():
-                    task = self._fetch_feed(session, source_name, feed_url)
-                    tasks.append(task)
-                
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                for result in results:
-                    if isinstance(result, Exception):
-                        logger.error(f"Error fetching feed: {result}")
-                        continue
-                    if result and isinstance(result, list):
-                        all_news.extend(result)
-            
-            # Filter for Esteghlal news
-            esteghlal_news = []
-            for news_item in all_news:
-                title = news_item.get('title', '').lower()
-                description = news_item.get('description', '').lower()
-                
-                # Check if "استقلال" is in title or description
-                if 'استقلال' in title or 'استقلال' in description:
-                    esteghlal_news.append(news_item)
-                    
-                if len(esteghlal_news) >= limit:
-                    break
-            
-            # Sort by publication date (newest first)
-            esteghlal_news.sort(key=lambda x: x.get('published_parsed', datetime.min), reverse=True)
-            
-            return esteghlal_news[:limit]
+            esteghlal_news = await self._collect('استقلال', limit)
+            if esteghlal_news:
+                self._esteghlal_cache[limit] = esteghlal_news
+            return esteghlal_news
             
         except Exception as e:
             logger.error(f"Error getting Esteghlal news: {e}")
@@ -134,33 +136,51 @@ class RSSParser:
         """Get all news from all sources"""
         return await self.get_latest_news(limit)
 
-    async def _fetch_feed(self, session: aiohttp.ClientSession, source_name: str, feed_url: str) -> List[Dict]:
-        """Fetch and parse a single RSS feed"""
+    async def _collect(self, keyword: Optional[str], limit: int) -> List[Dict]:
+        """Fetch all feeds concurrently and return the newest matching items"""
+        all_news = []
+        
+        session = await self._get_session()
+        tasks = []
+        for source_name, feed_url in self.rss_feeds.items():
+            task = self._fetch_feed(session, source_name, feed_url, keyword)
+            tasks.append(task)
+        
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error fetching feed: {result}")
+                continue
+            if result and isinstance(result, list):
+                all_news.extend(result)
+        
+        # Newest first; only the top `limit` items are ordered
+        return heapq.nlargest(limit, all_news, key=lambda x: x['_ts'])
+
+    async def _fetch_feed(self, session: aiohttp.ClientSession, source_name: str, feed_url: str,
+                          keyword: Optional[str] = None) -> List[Dict]:
+        """Fetch and parse a single RSS feed, keeping only entries that mention keyword"""
         try:
-            timeout = aiohttp.ClientTimeout(total=10)
-            async with session.get(feed_url, timeout=timeout) as response:
-                if response.status != 200:
-                    logger.warning(f"Failed to fetch {source_name}: HTTP {response.status}")
-                    return []
-                
-                content = await response.text()
-                
-            # Parse RSS feed
-            feed = feedparser.parse(content)
-            
-            if feed.bozo:
-                logger.warning(f"Feed {source_name} has parsing issues: {feed.bozo_exception}")
+            entries = await self._fetch_entries(session, source_name, feed_url)
             
             news_items = []
             
-            for entry in feed.entries[:10]:  # Limit per source
+            for entry in entries:
                 try:
+                    raw_title = entry.get('title', 'بدون عنوان')
+                    raw_description = entry.get('summary', entry.get('description', ''))
+                    
+                    # Filter before building the item so non-matching entries cost nothing
+                    if keyword is not None and keyword not in raw_title and keyword not in raw_description:
+                        continue
+                    
                     news_item = {
-                        'title': self._clean_text(entry.get('title', 'بدون عنوان')),
-                        'description': self._clean_text(entry.get('summary', entry.get('description', ''))),
+                        'title': self._clean_text(raw_title),
+                        'description': self._clean_text(raw_description),
                         'link': entry.get('link', ''),
-                        'published': self._format_date(entry.get('published', '')),
-                        'published_parsed': entry.get('published_parsed', datetime.min.timetuple()),
+                        '_published_raw': entry.get('published', ''),
+                        '_ts': self._timestamp(entry.get('published_parsed')),
                         'source': source_name
                     }
                     
@@ -174,7 +194,6 @@ class RSSParser:
                     logger.error(f"Error parsing entry from {source_name}: {e}")
                     continue
             
-            logger.info(f"Successfully fetched {len(news_items)} items from {source_name}")
             return news_items
             
         except asyncio.TimeoutError:
@@ -184,20 +203,83 @@ class RSSParser:
             logger.error(f"Error fetching feed from {source_name}: {e}")
             return []
 
+    async def _fetch_entries(self, session: aiohttp.ClientSession, source_name: str, feed_url: str) -> list:
+        """Return the raw entries of a feed, re-downloading only when it is due and changed"""
+        state = self._feed_state.get(source_name)
+        if state and time.monotonic() < self._next_poll_at.get(source_name, 0.0):
+            return state[2]
+        
+        timeout = aiohttp.ClientTimeout(total=10)
+        headers = {}
+        if state:
+            etag, last_modified, _ = state
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        
+        async with session.get(feed_url, timeout=timeout, headers=headers) as response:
+            if response.status == 304 and state:
+                logger.info(f"Feed {source_name} not modified, reusing {len(state[2])} entries")
+                self._schedule_next_poll(source_name, changed=False)
+                return state[2]
+            
+            if response.status != 200:
+                logger.warning(f"Failed to fetch {source_name}: HTTP {response.status}")
+                return []
+            
+            content = await response.text()
+            etag = response.headers.get('ETag', '')
+            last_modified = response.headers.get('Last-Modified', '')
+            
+        # Parse RSS feed in a worker thread; feedparser is pure Python and would block the loop
+        feed = await asyncio.to_thread(feedparser.parse, content)
+        
+        if feed.bozo:
+            logger.warning(f"Feed {source_name} has parsing issues: {feed.bozo_exception}")
+        
+        entries = feed.entries[:10]  # Limit per source
+        self._feed_state[source_name] = (etag, last_modified, entries)
+        
+        newest = max((e.get('published_parsed') for e in feed.entries if e.get('published_parsed')), default=None)
+        changed = newest is None or newest != self._newest_entry.get(source_name)
+        self._newest_entry[source_name] = newest
+        self._schedule_next_poll(source_name, changed)
+        
+        logger.info(f"Successfully fetched {len(entries)} entries from {source_name}")
+        return entries
+
+    @staticmethod
+    def _timestamp(published_parsed) -> float:
+        """Convert feedparser's UTC struct_time to epoch seconds for cheap sorting"""
+        if not published_parsed:
+            return 0.0
+        return float(calendar.timegm(published_parsed))
+
+    def _schedule_next_poll(self, source_name: str, changed: bool):
+        """Double the poll interval while a feed is idle, reset it on new items"""
+        if changed:
+            self._empty_streak[source_name] = 0
+        else:
+            self._empty_streak[source_name] = self._empty_streak.get(source_name, 0) + 1
+        
+        base = self.config.FEED_REFRESH_INTERVAL
+        interval = min(base * 2 ** self._empty_streak[source_name], max(base, 3600))
+        self._next_poll_at[source_name] = time.monotonic() + interval
+
     def _clean_text(self, text: str) -> str:
         """Clean and normalize Persian text"""
         if not text:
             return ""
         
         # Remove HTML tags
-        import re
-        text = re.sub('<[^<]+?>', '', text)
+        text = _HTML_TAG_RE.sub('', text)
         
         # Normalize Persian text
-        text = text.replace('ي', 'ی').replace('ك', 'ک')
+        text = text.translate(_AR2FA)
         
         # Remove extra whitespace
-        text = ' '.join(text.split())
+        text = _WS_RE.sub(' ', text)
         
         return text.strip()
 
@@ -209,16 +291,10 @@ class RSSParser:
             
             # Parse the date string
             try:
-                from email.utils import parsedate_to_datetime
                 dt = parsedate_to_datetime(date_str)
                 if dt:
                     # Format in Persian
-                    persian_months = [
-                        'ژانویه', 'فوریه', 'مارس', 'آپریل', 'مه', 'ژوئن',
-                        'ژوئیه', 'آگوست', 'سپتامبر', 'اکتبر', 'نوامبر', 'دسامبر'
-                    ]
-                    
-                    persian_date = f"{dt.day} {persian_months[dt.month-1]} {dt.year}"
+                    persian_date = f"{dt.day} {_PERSIAN_MONTHS[dt.month-1]} {dt.year}"
                     persian_time = f"{dt.hour:02d}:{dt.minute:02d}"
                     
                     return f"{persian_date} - {persian_time}"